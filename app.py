@@ -1,15 +1,59 @@
+import asyncio
+import atexit
 import base64
 import io
+import itertools
+import logging
+import logging.handlers
 import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, time, timedelta
-from flask import Flask, g, request, jsonify
+from cachetools import TLRUCache, TTLCache
+from flask import Flask, Response, g, request, jsonify
+from flask.json.provider import DefaultJSONProvider
+from flask.logging import default_handler
 from flask_cors import CORS
+import httpx
+import orjson
 import firebase_admin
-from firebase_admin import auth, credentials, firestore
+from firebase_admin import auth, credentials, firestore, firestore_async
 from google import genai
-from PIL import Image
+from google.genai import types
+from PIL import Image, ImageOps
+from pillow_heif import register_heif_opener
+
+# Lets PIL open HEIC/HEIF receipts (the default iPhone photo format) so they can be re-encoded as JPEG
+register_heif_opener()
+
+class ORJSONProvider(DefaultJSONProvider):
+    """
+    Serializes request and response bodies with orjson.
+    Datetimes are passed through to Flask's default handler so they keep Flask's HTTP date format.
+    """
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(
+            obj,
+            default=self.default,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        ).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
 
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
+
+# Request threads only enqueue log records; a listener thread writes them to stderr
+log_queue = queue.SimpleQueue()
+log_listener = logging.handlers.QueueListener(log_queue, default_handler)
+app.logger.removeHandler(default_handler)
+app.logger.addHandler(logging.handlers.QueueHandler(log_queue))
+log_listener.start()
+atexit.register(log_listener.stop)
+
 CORS(
     app,
     origins=["https://ai-spending-tracker.onrender.com"], 
@@ -22,6 +66,178 @@ SPENDING_CATEGORIES = [
     "Entertainment", "Utilities", "Travel", "Other"
 ]
 
+SUMMARY_PERIODS = ('daily', 'weekly', 'monthly')
+
+RECEIPT_PROMPT = "Scan this receipt. Based on the entire receipt, provide me in JSON format the below information: date(yyyy-MM-dd), merchantName, category(only one category based on the merchant, must select from " + ", ".join(SPENDING_CATEGORIES) + "), amount(total amount in the receipt). If the receipt is not valid, return an empty JSON object. "
+SUMMARY_PROMPT = "Based on the spending summary, provide a concise analysis of the user's spending habits. Include insights on top spending categories and any notable trends."
+
+# Receipt images are downscaled to fit within this many pixels per side before being sent to Gemini
+RECEIPT_MAX_DIMENSION = 1024
+RECEIPT_JPEG_QUALITY = 80
+# Image formats Gemini accepts as-is; receipts already in one of these and small enough skip re-encoding
+RECEIPT_PASSTHROUGH_MIME_TYPES = {'JPEG': 'image/jpeg', 'PNG': 'image/png'}
+
+# Transaction fields returned by GET /transactions; 'userId' is left out since it is always the caller's own uid
+TRANSACTION_LIST_FIELDS = ['date', 'amount', 'category', 'merchantName', 'createdAt']
+
+# Gemini insights for spending summaries are generated in the background on this many threads
+INSIGHTS_WORKERS = 4
+
+# Number of Firestore clients, each with its own gRPC channel, that reads are spread across
+FIRESTORE_POOL_SIZE = 4
+
+# Writes queued on the shared BulkWriter are committed in the background at this interval (seconds).
+BULK_WRITER_FLUSH_INTERVAL = 0.1
+BULK_WRITER_MAX_ATTEMPTS = 15
+
+# Seconds that a user's transactions list and spending summaries are served from memory; 0 disables the cache.
+# gunicorn.conf.py sets it to 0 when running several workers, since invalidation only reaches the writing worker.
+RESPONSE_CACHE_TTL = int(os.environ.get("RESPONSE_CACHE_TTL", "60"))
+RESPONSE_CACHE_MAXSIZE = 10000
+
+bulk_writer_lock = threading.Lock()
+bulk_writer_stop = threading.Event()
+# Creates queued on the current BulkWriter, and the users whose transactions are among them
+bulk_writer_pending_writes = 0
+bulk_writer_pending_users = set()
+
+# Response bodies keyed by ('transactions', user_id) and ('summary', user_id, period)
+response_cache = TTLCache(maxsize=RESPONSE_CACHE_MAXSIZE, ttl=RESPONSE_CACHE_TTL)
+response_cache_lock = threading.Lock()
+# Incremented on every invalidation. Each user's latest invalidation version is kept long enough
+# to outlive any request (gunicorn's timeout is 120 seconds), so a response read before it is not cached.
+response_cache_version = 0
+response_cache_invalidations = TTLCache(maxsize=RESPONSE_CACHE_MAXSIZE, ttl=600)
+
+def get_cached_response(key):
+    """
+    Returns the cached response body for the given key (None if it is missing or expired)
+    and the cache version to pass to cache_response if the body is computed instead.
+    """
+    with response_cache_lock:
+        return response_cache.get(key), response_cache_version
+
+def cache_response(key, body, version):
+    """
+    Stores a response body in the response cache, unless the user's responses were invalidated
+    after the given version was read, in which case the body may predate a committed write.
+    """
+    if not RESPONSE_CACHE_TTL:
+        return
+    user_id = key[1]
+    with response_cache_lock:
+        if response_cache_invalidations.get(user_id, -1) > version:
+            return
+        response_cache[key] = body
+
+def invalidate_user_responses(user_id):
+    """
+    Drops the cached transactions list and spending summaries of a user, and keeps responses
+    already being computed from being cached.
+    """
+    global response_cache_version
+    with response_cache_lock:
+        response_cache_version += 1
+        response_cache_invalidations[user_id] = response_cache_version
+        response_cache.pop(('transactions', user_id), None)
+        for period in SUMMARY_PERIODS:
+            response_cache.pop(('summary', user_id, period), None)
+
+def on_bulk_write_error(error, writer):
+    """
+    Logs a failed background write and retries it until the attempt limit is reached.
+    """
+    app.logger.warning("Bulk write failed (attempt %s): %s", error.attempts, error.message)
+    return error.attempts < BULK_WRITER_MAX_ATTEMPTS
+
+def new_bulk_writer():
+    """
+    Creates a BulkWriter on the default Firestore client with the app's error handling.
+    """
+    writer = db.bulk_writer()
+    writer.on_write_error(on_bulk_write_error)
+    return writer
+
+def queue_create(doc_ref, data, user_id=None):
+    """
+    Queues a document create on the shared BulkWriter for the next background commit.
+    If given, user_id is the owner of a transaction whose cached responses are dropped once it is committed.
+    """
+    global bulk_writer_pending_writes
+    with bulk_writer_lock:
+        bulk_writer.create(doc_ref, data)
+        bulk_writer_pending_writes += 1
+        if user_id is not None:
+            bulk_writer_pending_users.add(user_id)
+
+def commit_queued_writes():
+    """
+    Commits the creates queued so far.
+    A BulkWriter stops sending after its first flush(), so the queued writes move to a fresh writer
+    under the lock and the old one is closed outside it, letting new creates queue during the commit.
+    """
+    global bulk_writer, bulk_writer_pending_writes, bulk_writer_pending_users
+    with bulk_writer_lock:
+        if not bulk_writer_pending_writes:
+            return
+        writer = bulk_writer
+        committed_users = bulk_writer_pending_users
+        bulk_writer = new_bulk_writer()
+        bulk_writer_pending_writes = 0
+        bulk_writer_pending_users = set()
+
+    writer.close()
+
+    # Responses cached between the request and the commit would otherwise miss the new writes
+    for user_id in committed_users:
+        invalidate_user_responses(user_id)
+
+def flush_bulk_writer():
+    """
+    Commits the writes queued on the shared BulkWriter every BULK_WRITER_FLUSH_INTERVAL seconds,
+    so that creates from concurrent requests share batched commit RPCs.
+    """
+    while not bulk_writer_stop.wait(BULK_WRITER_FLUSH_INTERVAL):
+        try:
+            commit_queued_writes()
+        except Exception:
+            app.logger.exception("Error flushing bulk writer")
+
+def close_bulk_writer():
+    """
+    Stops the background flush and commits any writes still queued at shutdown.
+    """
+    bulk_writer_stop.set()
+    bulk_writer_thread.join()
+    commit_queued_writes()
+
+# Event loop owning the async Firestore client; request threads submit coroutines to it
+# so the per-category aggregation queries of a spending summary are in flight together.
+async_loop = asyncio.new_event_loop()
+threading.Thread(target=async_loop.run_forever, daemon=True).start()
+
+def run_async(coro):
+    """
+    Runs a coroutine on the shared event loop and blocks until its result is available.
+    """
+    return asyncio.run_coroutine_threadsafe(coro, async_loop).result()
+
+insights_executor = ThreadPoolExecutor(max_workers=INSIGHTS_WORKERS)
+
+def get_db():
+    """
+    Returns the next Firestore client from the pool in round-robin order.
+    """
+    return FIRESTORE_POOL[next(firestore_pool_index)]
+
+def snapshot_dicts(docs):
+    """
+    Returns the data of each document snapshot with its 'id' added.
+    The snapshot data is shallow-copied, since to_dict() deep-copies every document and
+    the handlers only serialize it.
+    """
+    return [{**doc._data, 'id': doc.id} for doc in docs]
+
 # --- Google Services Init ---
 
 try:
@@ -51,23 +267,67 @@ try:
 
     # Initialize Firestore DB
     db = firestore.client()
+    async_db = firestore_async.client()
+
+    # Extra clients open their own gRPC channels so concurrent reads don't queue on a single channel
+    FIRESTORE_POOL = [db] + [
+        firestore.Client(project=firebase_creds["project_id"], credentials=cred.get_credential())
+        for _ in range(FIRESTORE_POOL_SIZE - 1)
+    ]
+    firestore_pool_index = itertools.cycle(range(FIRESTORE_POOL_SIZE))
     print("Successfully connected to Firestore!")
 
+    # Document creates are queued here and committed in batches by a background thread
+    bulk_writer = new_bulk_writer()
+    bulk_writer_thread = threading.Thread(target=flush_bulk_writer, daemon=True)
+    bulk_writer_thread.start()
+    atexit.register(close_bulk_writer)
+
     # Initialize Gemini AI model
     GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
     if not GEMINI_API_KEY:
         raise ValueError("GEMINI_API_KEY environment variable not set.")
     
-    model = genai.Client()
+    # Keep Gemini requests on one HTTP/2 connection pool shared by all request threads
+    model = genai.Client(http_options=types.HttpOptions(client_args={
+        "http2": True,
+        "limits": httpx.Limits(max_connections=100, max_keepalive_connections=20)
+    }))
     print("Successfully initialized Gemini AI model (gemini-1.5-flash-latest)!")
 
 except Exception as e:
     print(f"Error during initialization: {e}")
     db = None
+    async_db = None
+    FIRESTORE_POOL = []
+    bulk_writer = None
     model = None
 
 # --- Authentication Middleware ---
 
+# Decoded ID token claims keyed by the raw token, each kept until the token's 'exp' time
+TOKEN_CACHE_MAXSIZE = 10000
+
+token_cache = TLRUCache(
+    maxsize=TOKEN_CACHE_MAXSIZE,
+    ttu=lambda token, claims, now: claims['exp'],
+    timer=lambda: datetime.now().timestamp()
+)
+token_cache_lock = threading.Lock()
+
+def verify_id_token_cached(id_token):
+    """
+    Verifies a Firebase ID token, reusing the decoded claims of previously verified tokens
+    until they expire so the signature is only checked once per token.
+    """
+    with token_cache_lock:
+        claims = token_cache.get(id_token)
+    if claims is None:
+        claims = auth.verify_id_token(id_token, check_revoked=False)
+        with token_cache_lock:
+            token_cache[id_token] = claims
+    return claims
+
 @app.before_request
 def verify_token():
     # Skip token verification for the healthcheck endpoint
@@ -80,7 +340,7 @@ def verify_token():
 
     id_token = auth_header.split('Bearer ')[1]
     try:
-        g.user = auth.verify_id_token(id_token)
+        g.user = verify_id_token_cached(id_token)
     except (auth.InvalidIdTokenError, ValueError) as e:
         return jsonify({"error": f"Invalid or expired token: {e}"}), 401
 
@@ -106,14 +366,10 @@ def get_users():
         return jsonify({"error": "Firestore is not initialized."}), 500
 
     try:
-        users_ref = db.collection('users')
+        users_ref = get_db().collection('users')
         docs_stream = users_ref.stream()
         
-        documents = []
-        for doc in docs_stream:
-            doc_data = doc.to_dict()
-            doc_data['id'] = doc.id
-            documents.append(doc_data)
+        documents = snapshot_dicts(docs_stream)
         
         if not documents:
             return jsonify({"message": "No documents found in collection 'users' or collection does not exist."}), 404
@@ -128,6 +384,7 @@ def create_user():
     Creates a new user in the 'users' collection.
     Expects 'email' and 'displayName' in the JSON body.
     The 'createdAt' field is automatically added with the server timestamp.
+    The write is queued and committed in the background, so the response is 202 Accepted.
     """
     if not db:
         return jsonify({"error": "Firestore is not initialized."}), 500
@@ -143,9 +400,10 @@ def create_user():
             'createdAt': firestore.SERVER_TIMESTAMP
         }
 
-        # Add a new doc with a generated ID and return its ID
-        update_time, doc_ref = db.collection('users').add(user_data)
-        return jsonify({"message": "User created successfully", "id": doc_ref.id}), 201
+        # Queue a new doc with a client-generated ID and return its ID
+        doc_ref = db.collection('users').document()
+        queue_create(doc_ref, user_data)
+        return jsonify({"message": "User accepted for creation", "id": doc_ref.id}), 202
     except Exception as e:
         return jsonify({"error": f"An error occurred while creating user: {e}"}), 500
 
@@ -153,35 +411,51 @@ def create_user():
 def get_transactions():
     """
     Fetches all transactions for the authenticated user from Firestore.
+    Only the id and the fields in TRANSACTION_LIST_FIELDS are returned.
     """
     if not db:
         return jsonify({"error": "Firestore is not initialized."}), 500
 
     try:
         user_id = g.user['uid']
+        cache_key = ('transactions', user_id)
+        documents, cache_version = get_cached_response(cache_key)
+        if documents is not None:
+            return jsonify(documents), 200
 
-        # Query for transactions belonging to the user
-        trans_ref = db.collection('transactions').where('userId', '==', user_id)
+        # Query for transactions belonging to the user, projecting only the fields the client renders
+        trans_ref = get_db().collection('transactions').where('userId', '==', user_id).select(TRANSACTION_LIST_FIELDS)
         docs_stream = trans_ref.stream()
 
-        documents = []
-        for doc in docs_stream:
-            doc_data = doc.to_dict()
-            doc_data['id'] = doc.id
-            documents.append(doc_data)
+        documents = snapshot_dicts(docs_stream)
 
         if not documents:
             return jsonify({"message": f"No transactions found for user {user_id}."}), 404
 
+        cache_response(cache_key, documents, cache_version)
         return jsonify(documents), 200
     except Exception as e:
         return jsonify({"error": f"An error occurred: {e}"}), 500
 
+def period_start_date(period):
+    """
+    Returns midnight at the start of the current day, week (Monday) or month for the given period.
+    """
+    today = datetime.now().date()
+    if period == 'daily':
+        start = today
+    elif period == 'weekly':
+        start = today - timedelta(days=today.weekday())
+    else:  # monthly
+        start = today.replace(day=1)
+    return datetime.combine(start, time.min)
+
 @app.route('/summary/spending', methods=['GET'])
 def get_spending_summary():
     """
     Calculates spending summary by category for the authenticated user
     for a specified period (daily, weekly, monthly).
+    Gemini insights for the summary are generated in the background and served by GET /summary/spending/insights.
     """
     if not db:
         return jsonify({"error": "Firestore is not initialized."}), 500
@@ -190,34 +464,55 @@ def get_spending_summary():
         user_id = g.user['uid']
         period = request.args.get('period', 'monthly').lower()
 
-        if period not in ['daily', 'weekly', 'monthly']:
+        if period not in SUMMARY_PERIODS:
             return jsonify({"error": "Invalid period. Supported values are 'daily', 'weekly', 'monthly'."}), 400
 
-        now = datetime.now()
-        if period == 'daily':
-            start_date = datetime.combine(now.date(), time.min)
-        elif period == 'weekly':
-            start_of_week = now.date() - timedelta(days=now.weekday())
-            start_date = datetime.combine(start_of_week, time.min)
-        else:  # monthly
-            start_of_month = now.date().replace(day=1)
-            start_date = datetime.combine(start_of_month, time.min)
-
-        # Query for transactions belonging to the user within the period
-        trans_ref = db.collection('transactions')
+        cache_key = ('summary', user_id, period)
+        result, cache_version = get_cached_response(cache_key)
+        if result is not None:
+            return jsonify(result), 200
+
+        start_date = period_start_date(period)
+
+        # Aggregate the user's transactions within the period on the server: one query per category,
+        # plus one for categories outside SPENDING_CATEGORIES
+        trans_ref = async_db.collection('transactions')
         query = trans_ref.where('userId', '==', user_id).where('date', '>=', start_date)
-        docs_stream = query.stream()
+        category_queries = [query.where('category', '==', category) for category in SPENDING_CATEGORIES]
+        uncategorized_query = query.where('category', 'not-in', SPENDING_CATEGORIES)
+
+        async def aggregate(category_query):
+            results = await category_query.sum('amount', alias='total').count(alias='count').get()
+            return {result.alias: result.value for result in results[0]}
+
+        async def sum_uncategorized():
+            # Categories outside the list are rare, so their few documents are summed by name here
+            totals = {}
+            async for doc in uncategorized_query.select(['category', 'amount']).stream():
+                transaction = doc.to_dict()
+                amount = transaction.get('amount', 0)
+                if isinstance(amount, (int, float)):
+                    totals[transaction['category']] = totals.get(transaction['category'], 0) + amount
+            return totals
+
+        async def summarize():
+            *category_aggregates, uncategorized = await asyncio.gather(
+                *(aggregate(category_query) for category_query in category_queries + [uncategorized_query])
+            )
+            uncategorized_totals = await sum_uncategorized() if uncategorized['count'] else {}
+            return category_aggregates, uncategorized_totals
+
+        category_aggregates, uncategorized_totals = run_async(summarize())
 
         spending_by_category = {}
         total_spent = 0
-        for doc in docs_stream:
-            transaction = doc.to_dict()
-            category = transaction.get('category', 'Other')
-            amount = transaction.get('amount', 0)
-
-            if isinstance(amount, (int, float)):
-                spending_by_category[category] = spending_by_category.get(category, 0) + amount
-                total_spent += amount
+        for category, aggregate_result in zip(SPENDING_CATEGORIES, category_aggregates):
+            if aggregate_result['count']:
+                spending_by_category[category] = aggregate_result['total'] or 0
+                total_spent += aggregate_result['total'] or 0
+        for category, total in uncategorized_totals.items():
+            spending_by_category[category] = total
+            total_spent += total
 
         if not spending_by_category:
             return jsonify({"message": f"No transactions found for user {user_id} in the '{period}' period."}), 404
@@ -235,15 +530,64 @@ def get_spending_summary():
             "topCategories": sorted_summary
         }
 
-        prompt = "Based on the spending summary, provide a concise analysis of the user's spending habits. Include insights on top spending categories and any notable trends." + str(result)
-        
+        # Insights are generated off the request path; clients fetch them from /summary/spending/insights
+        insights_executor.submit(generate_insights, user_id, period, result)
+
+        cache_response(cache_key, result, cache_version)
+        return jsonify(result), 200
+    except Exception as e:
+        return jsonify({"error": f"An error occurred: {e}"}), 500
+
+def generate_insights(user_id, period, summary):
+    """
+    Asks Gemini for an analysis of a spending summary and stores it under 'insights/{user_id}',
+    keyed by period, for GET /summary/spending/insights to return.
+    """
+    try:
+        prompt = SUMMARY_PROMPT + str(summary)
+
         response = model.models.generate_content(
             model="gemini-2.5-flash-lite-preview-06-17", contents=[prompt]
         )
 
-        result['insights'] = response.text
+        db.collection('insights').document(user_id).set({
+            period: {
+                'text': response.text,
+                'totalSpent': summary['totalSpent'],
+                'generatedAt': firestore.SERVER_TIMESTAMP
+            }
+        }, merge=True)
+    except Exception:
+        app.logger.exception("Error generating insights for user %s (%s)", user_id, period)
+
+@app.route('/summary/spending/insights', methods=['GET'])
+def get_spending_insights():
+    """
+    Fetches the latest Gemini analysis of the authenticated user's spending summary
+    for a specified period (daily, weekly, monthly).
+    Insights are generated in the background after GET /summary/spending, so clients poll this endpoint.
+    """
+    if not db:
+        return jsonify({"error": "Firestore is not initialized."}), 500
 
-        return jsonify(result), 200
+    try:
+        user_id = g.user['uid']
+        period = request.args.get('period', 'monthly').lower()
+
+        if period not in SUMMARY_PERIODS:
+            return jsonify({"error": "Invalid period. Supported values are 'daily', 'weekly', 'monthly'."}), 400
+
+        doc = get_db().collection('insights').document(user_id).get()
+        insights = (doc.to_dict() or {}).get(period) if doc.exists else None
+        if not insights:
+            return jsonify({"message": f"No insights available yet for user {user_id} in the '{period}' period."}), 404
+
+        return jsonify({
+            "period": period,
+            "insights": insights['text'],
+            "totalSpent": insights['totalSpent'],
+            "generatedAt": insights['generatedAt']
+        }), 200
     except Exception as e:
         return jsonify({"error": f"An error occurred: {e}"}), 500
 
@@ -253,13 +597,14 @@ def create_transaction():
     Creates a new transaction for the authenticated user.
     Expects 'merchantName', 'amount', 'category', and 'date' in the JSON body.
     The 'userId' and 'createdAt' fields are automatically added. The 'date' should be in 'YYYY-MM-DD' format.
+    The write is queued and committed in the background, so the response is 202 Accepted.
     """
     if not db:
         return jsonify({"error": "Firestore is not initialized."}), 500
 
     try:
         data = request.get_json()
-        print(f"Received data for transaction creation: {data}")
+        app.logger.debug("Received data for transaction creation: %s", data)
         required_fields = ['amount', 'category', 'date', 'merchantName']
         for field in required_fields:
             if field not in data:
@@ -282,9 +627,11 @@ def create_transaction():
             'createdAt': firestore.SERVER_TIMESTAMP
         }
 
-        # Add a new doc with a generated ID and return its ID
-        update_time, doc_ref = db.collection('transactions').add(transaction_data)
-        return jsonify({"message": "Transaction created successfully", "id": doc_ref.id}), 201
+        # Queue a new doc with a client-generated ID and return its ID
+        doc_ref = db.collection('transactions').document()
+        queue_create(doc_ref, transaction_data, user_id)
+        invalidate_user_responses(user_id)
+        return jsonify({"message": "Transaction accepted for creation", "id": doc_ref.id}), 202
     except Exception as e:
         return jsonify({"error": f"An error occurred while creating transaction: {e}"}), 500
 
@@ -292,25 +639,60 @@ def create_transaction():
 def receipt_scan():
     """
     Analyzes an image with a given prompt using the Gemini AI model.
-    Expects a base64-encoded 'image_data' in the JSON body.
+    Expects the receipt image as a 'receipt' file in a multipart/form-data body.
+    A base64-encoded 'image_data' in a JSON body is still accepted for older clients.
+    Clients that send 'Accept: text/event-stream' receive the model output as server-sent
+    events ('data: {"delta": ...}') as it is generated instead of a single JSON response.
     """
     try:
-        data = request.get_json()
-        prompt = "Scan this receipt. Based on the entire receipt, provide me in JSON format the below information: date(yyyy-MM-dd), merchantName, category(only one category based on the merchant, must select from " + ", ".join(SPENDING_CATEGORIES) + "), amount(total amount in the receipt). If the receipt is not valid, return an empty JSON object. "
-        image_data = data['image_data']
+        prompt = RECEIPT_PROMPT
+        receipt_file = request.files.get('receipt')
         try:
-            image_data = base64.b64decode(image_data)
+            if receipt_file:
+                image_data = receipt_file.read()
+            else:
+                data = request.get_json()
+                image_data = base64.b64decode(data['image_data'])
+            # Image.open only parses the header here; pixels are decoded only if the image must be resized or converted
             image = Image.open(io.BytesIO(image_data))
+            mime_type = RECEIPT_PASSTHROUGH_MIME_TYPES.get(image.format)
+            if mime_type and max(image.size) <= RECEIPT_MAX_DIMENSION:
+                image_part = types.Part.from_bytes(data=image_data, mime_type=mime_type)
+            else:
+                # Phone photos are far larger than OCR needs; shrink and re-encode to cut upload size and image tokens.
+                # The JPEG is saved without EXIF, so the orientation tag is applied to the pixels first.
+                image = ImageOps.exif_transpose(image)
+                image.thumbnail((RECEIPT_MAX_DIMENSION, RECEIPT_MAX_DIMENSION), Image.Resampling.LANCZOS)
+                buffer = io.BytesIO()
+                image.convert('RGB').save(buffer, 'JPEG', quality=RECEIPT_JPEG_QUALITY, optimize=True)
+                image_part = types.Part.from_bytes(data=buffer.getvalue(), mime_type='image/jpeg')
         except Exception as e:
             return jsonify({"error": f"Failed to process image data: {e}"}), 400
         
+        if request.accept_mimetypes.best_match(['application/json', 'text/event-stream']) == 'text/event-stream':
+            def generate_events():
+                try:
+                    for chunk in model.models.generate_content_stream(
+                        model="gemini-2.5-flash-lite-preview-06-17", contents=[prompt, image_part]
+                    ):
+                        if chunk.text:
+                            yield f"data: {app.json.dumps({'delta': chunk.text})}\n\n"
+                except Exception as e:
+                    yield f"event: error\ndata: {app.json.dumps({'error': f'An error occurred while generating content: {e}'})}\n\n"
+
+            return Response(generate_events(), mimetype='text/event-stream')
+
         response = model.models.generate_content(
-            model="gemini-2.5-flash-lite-preview-06-17", contents=[prompt, image]
+            model="gemini-2.5-flash-lite-preview-06-17", contents=[prompt, image_part]
         )
         return jsonify({"response": response.text})
     except Exception as e:
         return jsonify({"error": f"An error occurred while generating content: {e}"}), 500
 
 
+# Local development only; in production the app is served by gunicorn (see gunicorn.conf.py):
+#   gunicorn app:app
 if __name__ == '__main__':
-    app.run(debug=True)
+    # The logger is configured at import, before debug mode is known, so enable debug logging explicitly
+    app.logger.setLevel(logging.DEBUG)
+    app.run(debug=True, threaded=True)
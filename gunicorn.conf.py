@@ -0,0 +1,17 @@
+import os
+
+# Every endpoint waits on Firestore or Gemini, so each worker runs many threads to overlap that I/O.
+# Threaded workers are used instead of gevent because gevent's monkey-patching does not cooperate
+# with gRPC (Firestore) or with the asyncio loop thread the app runs its async Firestore client on.
+# One worker is the default: each worker holds its own Firestore/Gemini clients and in-memory caches.
+# WEB_CONCURRENCY can raise this on instances with memory to spare.
+bind = f"0.0.0.0:{os.environ.get('PORT', '8080')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", "1"))
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", "32"))
+timeout = 120
+
+# The app's response cache is per process and only invalidated in the worker that handled a write,
+# so it is turned off when requests are spread over several workers. Workers inherit this environment.
+if workers > 1:
+    os.environ["RESPONSE_CACHE_TTL"] = "0"
@@ -0,0 +1,55 @@
+import pytest
+from google.auth.credentials import AnonymousCredentials
+from google.cloud import firestore
+from google.cloud.firestore_v1.bulk_writer import BulkWriter
+from google.cloud.firestore_v1.types import BatchWriteResponse, WriteResult
+from google.rpc import status_pb2
+
+import app
+
+
+@pytest.fixture
+def committed_paths(monkeypatch):
+    """
+    Points the app at an offline Firestore client whose BulkWriter batches are recorded instead of sent.
+    Returns the list of document paths committed so far.
+    """
+    paths = []
+
+    def send(self, batch):
+        references = list(batch._document_references.values())
+        paths.extend(reference.path for reference in references)
+        return BatchWriteResponse(
+            write_results=[WriteResult() for _ in references],
+            status=[status_pb2.Status(code=0) for _ in references]
+        )
+
+    monkeypatch.setattr(BulkWriter, '_send', send)
+    monkeypatch.setattr(app, 'db', firestore.Client(project='test-project', credentials=AnonymousCredentials()))
+    monkeypatch.setattr(app, 'bulk_writer_pending_writes', 0)
+    monkeypatch.setattr(app, 'bulk_writer_pending_users', set())
+    monkeypatch.setattr(app, 'bulk_writer', app.new_bulk_writer())
+    return paths
+
+
+def test_create_after_idle_ticks_is_committed(committed_paths):
+    for _ in range(3):
+        app.commit_queued_writes()
+
+    doc_ref = app.db.collection('transactions').document()
+    app.queue_create(doc_ref, {'amount': 12.5}, 'user-1')
+    app.commit_queued_writes()
+
+    assert committed_paths == [doc_ref.path]
+
+
+def test_each_commit_sends_the_creates_queued_since_the_last(committed_paths):
+    first_ref = app.db.collection('users').document()
+    app.queue_create(first_ref, {'email': 'a@example.com'})
+    app.commit_queued_writes()
+
+    second_ref = app.db.collection('users').document()
+    app.queue_create(second_ref, {'email': 'b@example.com'})
+    app.commit_queued_writes()
+
+    assert committed_paths == [first_ref.path, second_ref.path]
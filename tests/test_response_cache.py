@@ -0,0 +1,42 @@
+import app
+
+
+def test_response_read_before_invalidation_is_not_cached():
+    key = ('transactions', 'user-race')
+    body, version = app.get_cached_response(key)
+    assert body is None
+
+    # A queued transaction is committed while the response is being computed
+    app.invalidate_user_responses('user-race')
+    app.cache_response(key, [{'id': 'stale'}], version)
+
+    assert app.get_cached_response(key)[0] is None
+
+
+def test_response_read_after_invalidation_is_cached():
+    key = ('summary', 'user-fresh', 'monthly')
+    app.invalidate_user_responses('user-fresh')
+
+    body, version = app.get_cached_response(key)
+    app.cache_response(key, {'totalSpent': 10}, version)
+
+    assert app.get_cached_response(key)[0] == {'totalSpent': 10}
+
+
+def test_invalidation_drops_all_cached_responses_of_the_user():
+    for key in [('transactions', 'user-drop'), ('summary', 'user-drop', 'weekly')]:
+        app.cache_response(key, {'cached': True}, app.get_cached_response(key)[1])
+
+    app.invalidate_user_responses('user-drop')
+
+    assert app.get_cached_response(('transactions', 'user-drop'))[0] is None
+    assert app.get_cached_response(('summary', 'user-drop', 'weekly'))[0] is None
+
+
+def test_nothing_is_cached_when_the_cache_is_disabled(monkeypatch):
+    monkeypatch.setattr(app, 'RESPONSE_CACHE_TTL', 0)
+    key = ('transactions', 'user-multi-worker')
+
+    app.cache_response(key, [{'id': 'tx'}], app.get_cached_response(key)[1])
+
+    assert app.get_cached_response(key)[0] is None